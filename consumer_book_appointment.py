@@ -1,13 +1,30 @@
-from datetime import datetime, time, timedelta
-from typing import List, Dict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from operator import attrgetter
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+from types import MappingProxyType
+from typing import Any, Callable, Iterator, List, Dict, Mapping, Set, Tuple
 import os
 import json
+import logging
+import sys
+import threading
 
 from zoneinfo import ZoneInfo  # Python 3.9+
+import google_auth_httplib2
+import httplib2
+import orjson
+from google.auth.transport.requests import Request
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
 
 
+logger = logging.getLogger(__name__)
+
 # === Configuration ===
 CALENDAR_CREDENTIALS = os.getenv("CALENDAR_CREDENTIALS", None)
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
@@ -16,6 +33,100 @@ LOCAL_TZ = ZoneInfo("America/Los_Angeles")
 WORK_START = time(9, 0)
 WORK_END = time(18, 0)
 
+# datetime.fromisoformat understands a trailing "Z" from Python 3.11 on
+_ISO_ACCEPTS_Z = sys.version_info >= (3, 11)
+
+# Only the event fields we read are requested (partial response)
+EVENT_FIELDS = (
+    "items(id,status,summary,start(dateTime,date),"
+    "organizer(email,displayName),attendees(email,displayName)),"
+    "etag,nextPageToken"
+)
+# Server-side maximum page size for events.list
+EVENTS_PAGE_SIZE = 2500
+
+# Calendar polls are I/O bound, so they run concurrently on a shared pool.
+# Kept small so bursts stay under Google's per-user rate limits
+# (rateLimitExceeded).
+MAX_FETCH_WORKERS = 8
+# Google accepts at most 50 sub-requests per batch HTTP request
+MAX_BATCH_SIZE = 50
+_FETCH_POOL = ThreadPoolExecutor(
+    max_workers=MAX_FETCH_WORKERS, thread_name_prefix="calendar-fetch"
+)
+
+# Credentials pooled per service account (see _creds_for), each paired with
+# the lock that serializes its token refreshes
+_creds_by_account: Dict[str, Tuple[Any, threading.Lock]] = {}
+_creds_lock = threading.Lock()
+
+# Last events.list response per (calendar, window, page) with its etag, so
+# unchanged calendars can be answered with 304 Not Modified
+ETAG_CACHE_SIZE = 1024
+_etag_cache: "OrderedDict[Tuple, Tuple[str, Dict]]" = OrderedDict()
+_etag_lock = threading.Lock()
+
+# Parsed calendar config files: path -> (st_mtime_ns, calendar_ids)
+_CAL_ID_CACHE: Dict[str, Tuple[int, List[str]]] = {}
+
+# httplib2 (used by googleapiclient) is not thread-safe, so every worker
+# thread keeps its own keep-alive connection and API clients
+HTTP_TIMEOUT = 30  # seconds
+_thread_local = threading.local()
+
+
+def _parse_credentials_map(raw: str | None) -> Mapping[str, Dict]:
+    """Parse CALENDAR_CREDENTIALS into a read-only calendar -> credentials map"""
+    if not raw:
+        return MappingProxyType({})
+    try:
+        parsed = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        logger.error("Failed to parse CALENDAR_CREDENTIALS: %s", e)
+        return MappingProxyType({})
+    if not isinstance(parsed, dict):
+        logger.error("CALENDAR_CREDENTIALS must be a JSON object keyed by calendar")
+        return MappingProxyType({})
+    return MappingProxyType(parsed)
+
+
+# Parsed once at import instead of on every credentials lookup
+_CRED_MAP = _parse_credentials_map(CALENDAR_CREDENTIALS)
+
+
+@dataclass(slots=True, frozen=True)
+class Appointment:
+    """One attendee's booking of a calendar event"""
+
+    event_id: str
+    calendar_id: str
+    event_summary: str
+    attendee_email: str | None
+    attendee_name: str
+    organizer_email: str | None
+    organizer_name: str | None
+    datetime: datetime
+    date: date
+    time: time
+    service_account: str  # calendar_id, used as identifier
+    # Normalized once at ingestion for AppointmentIndex.lookup
+    name_lc: str = field(default="", repr=False, compare=False)
+    name_ns: str = field(default="", repr=False, compare=False)
+    summary_lc: str = field(default="", repr=False, compare=False)
+
+
+class _OrjsonModel(JsonModel):
+    """googleapiclient JsonModel that decodes response bodies with orjson"""
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return super().deserialize(content)
+        if self._data_wrapper and isinstance(body, dict) and "data" in body:
+            body = body["data"]
+        return body
+
 
 # === Core Appointment Functions ===
 
@@ -41,67 +152,681 @@ def get_credentials_for_calendar(calendar_email: str):
         service_account.Credentials object or None if not found
     """
     if not CALENDAR_CREDENTIALS:
-        print("⚠️  CALENDAR_CREDENTIALS environment variable not set")
+        logger.warning("CALENDAR_CREDENTIALS environment variable not set")
         return None
 
     try:
-        credentials_map = json.loads(CALENDAR_CREDENTIALS)
-
-        if calendar_email not in credentials_map:
-            print(f"⚠️  No credentials found for calendar: {calendar_email}")
+        if calendar_email not in _CRED_MAP:
+            logger.warning("No credentials found for calendar: %s", calendar_email)
             return None
 
-        creds_dict = credentials_map[calendar_email]
+        creds_dict = _CRED_MAP[calendar_email]
 
         # Create credentials from dictionary
         creds = service_account.Credentials.from_service_account_info(
             creds_dict, scopes=SCOPES
         )
-        print(f"✅ Loaded credentials for calendar: {calendar_email}")
+        logger.info("Loaded credentials for calendar: %s", calendar_email)
         return creds
 
-    except json.JSONDecodeError as e:
-        print(f"❌ Failed to parse CALENDAR_CREDENTIALS: {e}")
-        return None
     except Exception as e:
-        print(f"❌ Error loading credentials for {calendar_email}: {e}")
+        logger.error("Error loading credentials for %s: %s", calendar_email, e)
         return None
 
 
+def _account_key(calendar_id: str) -> str:
+    """Identify the service account that owns a calendar's credentials"""
+    info = _CRED_MAP.get(calendar_id) or {}
+    return info.get("client_email") or calendar_id
+
+
+def _creds_entry(calendar_id: str) -> Tuple[Any, threading.Lock]:
+    """(credentials, token refresh lock) of a calendar's service account"""
+    account = _account_key(calendar_id)
+    with _creds_lock:
+        if account not in _creds_by_account:
+            _creds_by_account[account] = (
+                get_credentials_for_calendar(calendar_id),
+                threading.Lock(),
+            )
+        return _creds_by_account[account]
+
+
+def _creds_for(calendar_id: str):
+    """
+    Pooled get_credentials_for_calendar, one Credentials per service account
+
+    Building Credentials parses the RSA private key, so it happens once per
+    account and process; calendars of the same account also share its
+    access token.
+    """
+    return _creds_entry(calendar_id)[0]
+
+
+def _ensure_fresh_token(calendar_id: str) -> None:
+    """
+    Make sure the calendar's credentials hold a valid access token
+
+    Credentials are pooled per service account, so the token is reused
+    across requests; refreshing under the account's own lock keeps
+    concurrent batches from each hitting the OAuth token endpoint without
+    making other accounts wait. Freshness is google-auth's creds.valid,
+    which already counts tokens close to expiry as invalid; a shorter
+    margin of our own would leave those to the client library, which then
+    refreshes them in every batch thread outside the lock.
+    """
+    creds, token_lock = _creds_entry(calendar_id)
+    with token_lock:
+        if creds.valid:
+            return
+        creds.refresh(Request())
+
+
+def _service_for(calendar_id: str):
+    """
+    Build the Calendar API client for a calendar's service account once per
+    thread and reuse it
+
+    Uses the discovery document bundled with googleapiclient so no
+    discovery HTTP request is made, and the thread's shared httplib2
+    connection so consecutive polls skip the TLS handshake.
+    """
+    services = getattr(_thread_local, "services", None)
+    if services is None:
+        services = _thread_local.services = {}
+        # One connection pool per thread, shared by all of its API clients
+        _thread_local.http = httplib2.Http(timeout=HTTP_TIMEOUT)
+
+    account = _account_key(calendar_id)
+    if account not in services:
+        creds = _creds_for(calendar_id)
+        services[account] = (
+            build(
+                "calendar",
+                "v3",
+                http=google_auth_httplib2.AuthorizedHttp(
+                    creds, http=_thread_local.http
+                ),
+                cache_discovery=False,
+                static_discovery=True,
+                model=_OrjsonModel(),
+            )
+            if creds
+            else None
+        )
+    return services[account]
+
+
+def _cached_events_page(key: Tuple) -> Tuple[str, Dict] | None:
+    with _etag_lock:
+        entry = _etag_cache.get(key)
+        if entry is not None:
+            _etag_cache.move_to_end(key)
+        return entry
+
+
+def _store_events_page(key: Tuple, response: Dict) -> None:
+    if not response.get("etag"):
+        return
+    with _etag_lock:
+        _etag_cache[key] = (response["etag"], response)
+        _etag_cache.move_to_end(key)
+        while len(_etag_cache) > ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+
+
+def _fetch_events_batch(
+    calendar_ids: List[str],
+    time_min: datetime,
+    time_max: datetime,
+    query: str | None = None,
+) -> Tuple[Dict[str, List[Dict]], Set[str]]:
+    """
+    Query the raw events of several calendars in one batch HTTP request
+
+    All calendars must share the same service account. Calendars without
+    credentials map to an empty list. query is passed as events.list's
+    free-text filter (q).
+
+    Returns the events per calendar and the set of calendars whose request
+    failed; their event lists may be empty or incomplete.
+    """
+    events_by_calendar: Dict[str, List[Dict]] = {cid: [] for cid in calendar_ids}
+    failed: Set[str] = set()
+    # calendar_id -> page token of the next page still to fetch
+    pending: Dict[str, str | None] = dict.fromkeys(calendar_ids)
+
+    time_min_str = time_min.isoformat()
+    time_max_str = time_max.isoformat()
+
+    def _on_events(request_id, response, exception):
+        key = (request_id, time_min_str, time_max_str, query, page_tokens[request_id])
+        if exception is not None:
+            # The page whose etag was sent; the LRU may have evicted it since
+            cached = revalidating.get(request_id)
+            if not (
+                isinstance(exception, HttpError)
+                and exception.resp.status == 304
+                and cached
+            ):
+                logger.warning("Error polling calendar %s: %s", request_id, exception)
+                failed.add(request_id)
+                return
+            # Not modified since the cached response
+            response = cached[1]
+            _store_events_page(key, response)
+        else:
+            _store_events_page(key, response)
+
+        events_by_calendar[request_id].extend(response.get("items", []))
+        if response.get("nextPageToken"):
+            pending[request_id] = response["nextPageToken"]
+
+    try:
+        # Any calendar of the group yields a client for the shared account
+        service_api = _service_for(calendar_ids[0])
+        if not service_api:
+            for calendar_id in calendar_ids:
+                logger.warning("Skipping %s - no credentials", calendar_id)
+            return events_by_calendar, failed
+
+        _ensure_fresh_token(calendar_ids[0])
+
+        # One batch per round; later rounds only fetch the remaining pages
+        while pending:
+            page_tokens, pending = pending, {}
+            # calendar_id -> (etag, response) sent as If-None-Match this round
+            revalidating: Dict[str, Tuple[str, Dict]] = {}
+            batch = service_api.new_batch_http_request(callback=_on_events)
+            for calendar_id, page_token in page_tokens.items():
+                request = service_api.events().list(
+                    calendarId=calendar_id,
+                    timeMin=time_min_str,
+                    timeMax=time_max_str,
+                    singleEvents=True,
+                    orderBy="startTime",
+                    maxResults=EVENTS_PAGE_SIZE,
+                    fields=EVENT_FIELDS,
+                    pageToken=page_token,
+                    q=query,
+                )
+                cached = _cached_events_page(
+                    (calendar_id, time_min_str, time_max_str, query, page_token)
+                )
+                if cached:
+                    request.headers["If-None-Match"] = cached[0]
+                    revalidating[calendar_id] = cached
+                batch.add(request, request_id=calendar_id)
+            batch.execute()
+
+    except Exception as e:
+        logger.error("Error with calendar(s) %s: %s", ", ".join(calendar_ids), e)
+        failed.update(calendar_ids)
+
+    return events_by_calendar, failed
+
+
+def _iter_event_batches(
+    calendar_ids: List[str],
+    time_min: datetime,
+    time_max: datetime,
+    query: str | None = None,
+) -> Iterator[Tuple[Dict[str, List[Dict]], Set[str]]]:
+    """
+    Poll all calendars, one batch request per service account
+
+    Batches of up to MAX_BATCH_SIZE calendars run concurrently on the
+    fetch pool; each batch's _fetch_events_batch result is yielded as soon
+    as it completes, in completion order.
+    """
+    batches = [
+        ids[i : i + MAX_BATCH_SIZE]
+        for ids in _calendars_by_account(calendar_ids).values()
+        for i in range(0, len(ids), MAX_BATCH_SIZE)
+    ]
+
+    # as_completed drops each future once yielded, so consumed batches can
+    # be freed while later ones are still running
+    for future in as_completed(
+        [
+            _FETCH_POOL.submit(_fetch_events_batch, ids, time_min, time_max, query)
+            for ids in batches
+        ]
+    ):
+        yield future.result()
+
+
+def _fetch_all_events(
+    calendar_ids: List[str],
+    time_min: datetime,
+    time_max: datetime,
+    query: str | None = None,
+) -> Tuple[List[Tuple[str, List[Dict]]], Set[str]]:
+    """
+    Poll all calendars and wait for every batch
+
+    Returns (calendar_id, events) pairs in the same order as calendar_ids,
+    and the calendars that could not be read.
+    """
+    # Merge on the calling thread as batches finish; no locking needed
+    events_by_calendar: Dict[str, List[Dict]] = {}
+    failed: Set[str] = set()
+    for batch_events, batch_failed in _iter_event_batches(
+        calendar_ids, time_min, time_max, query
+    ):
+        events_by_calendar.update(batch_events)
+        failed |= batch_failed
+
+    return [(cid, events_by_calendar[cid]) for cid in calendar_ids], failed
+
+
+def _calendars_by_account(calendar_ids: List[str]) -> Dict[str, List[str]]:
+    """Group distinct calendar IDs by the service account that can read them"""
+    calendars_by_account: Dict[str, List[str]] = {}
+    for calendar_id in dict.fromkeys(calendar_ids):
+        calendars_by_account.setdefault(_account_key(calendar_id), []).append(
+            calendar_id
+        )
+    return calendars_by_account
+
+
+def _freebusy(
+    calendar_ids: List[str], time_min: datetime, time_max: datetime
+) -> Dict[str, List[Dict]]:
+    """
+    Busy intervals of calendars sharing one service account via freebusy.query
+
+    One request covers up to MAX_BATCH_SIZE calendars and returns only
+    start/end pairs, no event details. Raises RuntimeError if a calendar
+    cannot be read (no credentials, no access, not found).
+    """
+    busy: Dict[str, List[Dict]] = {}
+    service_api = _service_for(calendar_ids[0])
+    if not service_api:
+        raise RuntimeError(f"No credentials for calendar(s) {', '.join(calendar_ids)}")
+
+    _ensure_fresh_token(calendar_ids[0])
+    for i in range(0, len(calendar_ids), MAX_BATCH_SIZE):
+        result = (
+            service_api.freebusy()
+            .query(
+                body={
+                    "timeMin": time_min.isoformat(),
+                    "timeMax": time_max.isoformat(),
+                    "items": [
+                        {"id": cid} for cid in calendar_ids[i : i + MAX_BATCH_SIZE]
+                    ],
+                }
+            )
+            .execute()
+        )
+        calendars = result.get("calendars", {})
+        for calendar_id in calendar_ids[i : i + MAX_BATCH_SIZE]:
+            info = calendars.get(calendar_id)
+            if info is None or info.get("errors"):
+                raise RuntimeError(
+                    f"Free/busy error for calendar {calendar_id}: "
+                    f"{info.get('errors') if info else 'missing from response'}"
+                )
+            busy[calendar_id] = info.get("busy", [])
+    return busy
+
+
+def is_slot_free(
+    start: datetime, end: datetime, calendar_ids_file: str = "calendars.json"
+) -> bool:
+    """
+    Check whether no configured calendar is busy between start and end
+
+    Uses freebusy.query, one request per service account, instead of
+    listing events. The check fails closed: if no calendars are configured
+    or any calendar cannot be read, the slot is reported as not free.
+
+    Args:
+        start: Slot start (timezone-aware datetime)
+        end: Slot end (timezone-aware datetime)
+        calendar_ids_file: Path to JSON file containing calendar IDs (default: "calendars.json")
+
+    Returns:
+        True if every calendar was read and none has a busy interval in the slot
+    """
+    calendar_ids = load_calendar_ids_from_file(calendar_ids_file)
+    if not calendar_ids:
+        logger.warning("No calendar IDs found, reporting slot as busy")
+        return False
+
+    futures = [
+        _FETCH_POOL.submit(_freebusy, ids, start, end)
+        for ids in _calendars_by_account(calendar_ids).values()
+    ]
+    try:
+        return not any(
+            intervals
+            for future in as_completed(futures)
+            for intervals in future.result().values()
+        )
+    except Exception as e:
+        logger.error("Error checking free/busy, reporting slot as busy: %s", e)
+        return False
+
+
+def _day_bounds(target_date: date) -> Tuple[datetime, datetime]:
+    """Local midnight at the start of target_date and of the following day"""
+    time_min = datetime.combine(target_date, time.min).replace(tzinfo=LOCAL_TZ)
+    time_max = datetime.combine(target_date + timedelta(days=1), time.min).replace(
+        tzinfo=LOCAL_TZ
+    )
+    return time_min, time_max
+
+
+def _expand_events(
+    calendar_id: str, events: List[Dict], include_unattended: bool = False
+) -> List[Appointment]:
+    """
+    Expand a calendar's events to one appointment per attendee, with
+    normalized name/summary strings for matching
+
+    With include_unattended, events without attendees yield a single
+    "No attendee" appointment instead of being skipped.
+    """
+    appointments = []
+
+    # Hoisted to locals for the per-event loop
+    fromiso = datetime.fromisoformat
+    local_tz = LOCAL_TZ
+    iso_accepts_z = _ISO_ACCEPTS_Z
+
+    for event in events:
+        # Cancelled instances of recurring events are not appointments
+        if event.get("status") == "cancelled":
+            continue
+
+        event_id = event.get("id")
+        summary = event.get("summary", "")
+        start_time_str = event["start"].get("dateTime", event["start"].get("date"))
+
+        if "T" in start_time_str:
+            if not iso_accepts_z:
+                start_time_str = start_time_str.replace("Z", "+00:00")
+            appointment_datetime = fromiso(start_time_str)
+        else:
+            appointment_datetime = fromiso(start_time_str).replace(tzinfo=local_tz)
+
+        attendees = event.get("attendees", [])
+        organizer = event.get("organizer", {})
+        organizer_email = organizer.get("email")
+        organizer_name = organizer.get("displayName")
+        summary_lc = summary.lower() if summary else ""
+
+        if not attendees and include_unattended:
+            attendees = [None]
+
+        for attendee in attendees:
+            if attendee is None:
+                # Event without attendees
+                attendee_email = None
+                attendee_name = "No attendee"
+                name_lc = ""
+            else:
+                attendee_email = attendee.get("email")
+                attendee_name = attendee.get("displayName", attendee_email or "")
+                name_lc = attendee_name.lower() if attendee_name else ""
+            appointment = Appointment(
+                event_id=event_id,
+                calendar_id=calendar_id,
+                event_summary=summary,
+                attendee_email=attendee_email,
+                attendee_name=attendee_name,
+                organizer_email=organizer_email,
+                organizer_name=organizer_name,
+                datetime=appointment_datetime,
+                date=appointment_datetime.date(),
+                time=appointment_datetime.time(),
+                service_account=calendar_id,
+                name_lc=name_lc,
+                name_ns=name_lc.replace(" ", ""),
+                summary_lc=summary_lc,
+            )
+            appointments.append(appointment)
+
+    return appointments
+
+
+def _collect_appointments(
+    calendar_ids: List[str],
+    target_date: date,
+    include_unattended: bool = False,
+    query: str | None = None,
+) -> Tuple[List[Appointment], bool]:
+    """
+    Fetch the events of target_date and expand them to appointments (see
+    _expand_events)
+
+    query narrows the events server-side (events.list q=). Also returns
+    whether every calendar was read; incomplete results must not be cached.
+    """
+    time_min, time_max = _day_bounds(target_date)
+    events_by_calendar, failed = _fetch_all_events(
+        calendar_ids, time_min, time_max, query
+    )
+
+    all_appointments = []
+    for calendar_id, events in events_by_calendar:
+        all_appointments.extend(_expand_events(calendar_id, events, include_unattended))
+
+    return all_appointments, not failed
+
+
+@dataclass(slots=True)
+class _KeyLoad:
+    """In-flight load of one _TTLCache key"""
+
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # callers waiting on or running the load, to know when to drop it
+    users: int = 0
+    # bumped by invalidate(); a load started before the bump must not store
+    generation: int = 0
+
+
+class _TTLCache:
+    """Small thread-safe cache whose entries expire ttl seconds after insert"""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: Dict[Any, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[Any, _KeyLoad] = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value) -> None:
+        # caller holds self._lock
+        now = monotonic()
+        if len(self._entries) >= self.maxsize:
+            # Drop expired entries first, then the oldest ones
+            expired = [k for k, (exp, _) in self._entries.items() if exp <= now]
+            for key_ in expired:
+                del self._entries[key_]
+            while len(self._entries) >= self.maxsize:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (now + self.ttl, value)
+
+    def get_or_load(self, key, loader: Callable[[], Tuple[Any, bool]]):
+        """
+        Return the cached value or compute it with loader()
+
+        loader returns (value, cacheable); a value built from incomplete
+        data is returned to the caller but not stored. Concurrent misses on
+        the same key wait for a single loader call instead of each fetching
+        the same data. A value whose key was invalidated while it loaded is
+        not stored either, since it may predate the change.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            load = self._loading.get(key)
+            if load is None:
+                load = self._loading[key] = _KeyLoad()
+            load.users += 1
+        try:
+            with load.lock:
+                value = self.get(key)
+                if value is None:
+                    with self._lock:
+                        generation = load.generation
+                    value, cacheable = loader()
+                    if cacheable:
+                        with self._lock:
+                            if load.generation == generation:
+                                self._store(key, value)
+                return value
+        finally:
+            with self._lock:
+                load.users -= 1
+                if not load.users:
+                    del self._loading[key]
+
+    def invalidate(self, predicate: Callable[[Any], bool]) -> None:
+        """Drop every entry whose key satisfies predicate"""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+            # Loads already running read the data before this call
+            for key, load in self._loading.items():
+                if predicate(key):
+                    load.generation += 1
+
+
+def _service_matches(service_lower: str, summary_lc: str) -> bool:
+    """Match service (flexible - substring match either way)"""
+    return service_lower in summary_lc or summary_lc in service_lower
+
+
+class AppointmentIndex:
+    """Attendee appointments bucketed by date for customer lookups"""
+
+    def __init__(self, appointments: List[Appointment]):
+        self.by_date: Dict[date, List[Appointment]] = defaultdict(list)
+        for appt in appointments:
+            self.by_date[appt.date].append(appt)
+
+    def lookup(
+        self, first_name: str, last_name: str, target_date: date, service: str
+    ) -> List[Appointment]:
+        """Appointments on target_date matching the customer name and service"""
+        full_name = f"{first_name} {last_name}".strip().lower()
+        full_name_no_space = full_name.replace(" ", "")  # Remove spaces for matching
+        service_lower = service.lower()
+
+        matched = []
+        # Only that day's bucket is scanned; events overlapping the fetch
+        # window that start on the previous day land in another bucket
+        for appt in self.by_date.get(target_date, ()):
+            appt_name = appt.name_lc
+            appt_name_no_space = appt.name_ns
+            appt_service = appt.summary_lc
+
+            # Match name (flexible - check if names match with or without spaces)
+            name_match = (
+                full_name in appt_name
+                or appt_name in full_name
+                or full_name_no_space in appt_name_no_space
+                or appt_name_no_space in full_name_no_space
+            )
+
+            if name_match and _service_matches(service_lower, appt_service):
+                matched.append(appt)
+
+        return matched
+
+    def lookup_email(
+        self, email: str, target_date: date, service: str
+    ) -> List[Appointment]:
+        """Appointments on target_date booked by email for the service"""
+        email_lc = email.strip().lower()
+        service_lower = service.lower()
+        return [
+            appt
+            for appt in self.by_date.get(target_date, ())
+            if (appt.attendee_email or "").lower() == email_lc
+            and _service_matches(service_lower, appt.summary_lc)
+        ]
+
+
+# Admins tend to repeat searches for the same day, so results are reused
+# for a short while. Both caches are keyed by (calendar_ids, date):
+#   _day_cache   -> sorted appointments of the day (admin view)
+#   _index_cache -> AppointmentIndex of the day (customer search)
+APPOINTMENT_CACHE_TTL_SECONDS = 30
+_day_cache = _TTLCache(ttl=APPOINTMENT_CACHE_TTL_SECONDS, maxsize=64)
+_index_cache = _TTLCache(ttl=APPOINTMENT_CACHE_TTL_SECONDS, maxsize=64)
+
+
+def invalidate_date(target_date: date | datetime) -> None:
+    """
+    Forget cached appointments of a date
+
+    Call after creating, moving or cancelling a booking so the next search
+    for that day hits Google Calendar again.
+    """
+    if isinstance(target_date, datetime):
+        target_date = target_date.date()
+    for cache in (_day_cache, _index_cache):
+        cache.invalidate(lambda key: key[1] == target_date)
+
+
 def load_calendar_ids_from_file(json_file: str = "calendars.json") -> List[str]:
     """
     Load calendar IDs from a JSON configuration file
 
+    The parsed list is cached until the file's modification time changes.
+
     Args:
         json_file: Path to JSON file containing calendar configuration
 
     Returns:
         List of calendar IDs
     """
-    import json
-    import os
-
     calendar_ids = []
     try:
-        if os.path.exists(json_file):
-            with open(json_file, "r") as f:
-                config = json.load(f)
-                for cal in config.get("calendars", []):
-                    calendar_ids.append(cal["id"])
-            print(f"📋 Loaded {len(calendar_ids)} calendar ID(s) from {json_file}")
-        else:
-            print(f"⚠️  Calendar config file not found: {json_file}")
+        mtime_ns = os.stat(json_file).st_mtime_ns
+        cached = _CAL_ID_CACHE.get(json_file)
+        if cached and cached[0] == mtime_ns:
+            return list(cached[1])
+
+        with open(json_file, "r") as f:
+            config = json.load(f)
+            for cal in config.get("calendars", []):
+                calendar_ids.append(cal["id"])
+        _CAL_ID_CACHE[json_file] = (mtime_ns, calendar_ids)
+        logger.info("Loaded %d calendar ID(s) from %s", len(calendar_ids), json_file)
+    except FileNotFoundError:
+        logger.warning("Calendar config file not found: %s", json_file)
     except Exception as e:
-        print(f"❌ Error reading calendar config: {e}")
+        logger.error("Error reading calendar config: %s", e)
 
-    return calendar_ids
+    return list(calendar_ids)
 
 
 def get_appointments_by_date(
     target_date: datetime,
     service_account_file: str | List[str] | None = None,
     calendar_ids_file: str = "calendars.json",
-) -> List[Dict]:
+) -> List[Appointment]:
     """
     Retrieve all appointments for a specific date (for admin viewing)
 
@@ -124,128 +849,90 @@ def get_appointments_by_date(
         calendar_ids = load_calendar_ids_from_file(calendar_ids_file)
 
         if not calendar_ids:
-            print("⚠️  No calendar IDs found")
+            logger.warning("No calendar IDs found")
             return []
 
         target_date_obj = (
             target_date.date() if isinstance(target_date, datetime) else target_date
         )
 
-        print("📅 Searching for appointments on date:")
-        print(f"   Date: {target_date_obj}")
-        print(f"   Searching {len(calendar_ids)} calendar(s)...")
-
-        # Collect appointments from all calendars
-        all_appointments = []
-        time_min = datetime.combine(target_date_obj, time.min).replace(tzinfo=LOCAL_TZ)
-        time_max = datetime.combine(
-            target_date_obj + timedelta(days=1), time.min
-        ).replace(tzinfo=LOCAL_TZ)
-
-        # Process each calendar
-        for calendar_id in calendar_ids:
-            try:
-                # Get credentials for this specific calendar
-                creds = get_credentials_for_calendar(calendar_id)
-                if not creds:
-                    print(f"⚠️  Skipping {calendar_id} - no credentials")
-                    continue
-
-                service_api = build("calendar", "v3", credentials=creds)
-
-                # Query events from this calendar
-                try:
-                    events_result = (
-                        service_api.events()
-                        .list(
-                            calendarId=calendar_id,
-                            timeMin=time_min.isoformat(),
-                            timeMax=time_max.isoformat(),
-                            singleEvents=True,
-                            orderBy="startTime",
-                        )
-                        .execute()
-                    )
-
-                    events = events_result.get("items", [])
-
-                    for event in events:
-                        event_id = event.get("id")
-                        summary = event.get("summary", "")
-                        start_time_str = event["start"].get(
-                            "dateTime", event["start"].get("date")
-                        )
-
-                        if "T" in start_time_str:
-                            appointment_datetime = datetime.fromisoformat(
-                                start_time_str.replace("Z", "+00:00")
-                            )
-                        else:
-                            appointment_datetime = datetime.fromisoformat(
-                                start_time_str
-                            ).replace(tzinfo=LOCAL_TZ)
-
-                        attendees = event.get("attendees", [])
-                        organizer = event.get("organizer", {})
-                        organizer_email = organizer.get("email")
-                        organizer_name = organizer.get("displayName")
-
-                        # Add event even without attendees for admin view
-                        if attendees:
-                            for attendee in attendees:
-                                appointment = {
-                                    "event_id": event_id,
-                                    "calendar_id": calendar_id,
-                                    "event_summary": summary,
-                                    "attendee_email": attendee.get("email"),
-                                    "attendee_name": attendee.get(
-                                        "displayName", attendee.get("email", "")
-                                    ),
-                                    "organizer_email": organizer_email,
-                                    "organizer_name": organizer_name,
-                                    "datetime": appointment_datetime,
-                                    "date": appointment_datetime.date(),
-                                    "time": appointment_datetime.time(),
-                                    "service_account": calendar_id,  # Use calendar_id as identifier
-                                }
-                                all_appointments.append(appointment)
-                        else:
-                            # Event without attendees
-                            appointment = {
-                                "event_id": event_id,
-                                "calendar_id": calendar_id,
-                                "event_summary": summary,
-                                "attendee_email": None,
-                                "attendee_name": "No attendee",
-                                "organizer_email": organizer_email,
-                                "organizer_name": organizer_name,
-                                "datetime": appointment_datetime,
-                                "date": appointment_datetime.date(),
-                                "time": appointment_datetime.time(),
-                                "service_account": calendar_id,  # Use calendar_id as identifier
-                            }
-                            all_appointments.append(appointment)
-
-                except Exception as e:
-                    print(f"⚠️  Error polling calendar {calendar_id}: {e}")
-
-            except Exception as e:
-                print(f"❌ Error with calendar {calendar_id}: {e}")
-
-        # Sort by time
-        all_appointments.sort(key=lambda x: x["time"])
-
-        print(f"\n✅ Found {len(all_appointments)} appointment(s) on {target_date_obj}")
+        logger.info(
+            "Searching %d calendar(s) for appointments on %s",
+            len(calendar_ids),
+            target_date_obj,
+        )
+
+        def load_day() -> Tuple[List[Appointment], bool]:
+            # Collect appointments from all calendars, including events without
+            # attendees for the admin view
+            day, complete = _collect_appointments(
+                calendar_ids, target_date_obj, include_unattended=True
+            )
+
+            # Sort by time; each calendar's events arrive in startTime order,
+            # so this is a run merge rather than a full O(n log n) sort
+            day.sort(key=attrgetter("time"))
+            return day, complete
+
+        # Callers get their own list; the cached one stays untouched
+        all_appointments = list(
+            _day_cache.get_or_load((tuple(calendar_ids), target_date_obj), load_day)
+        )
+
+        logger.info(
+            "Found %d appointment(s) on %s", len(all_appointments), target_date_obj
+        )
         return all_appointments
 
     except Exception as e:
-        print(f"❌ Error retrieving appointments: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("Error retrieving appointments: %s", e)
         return []
 
 
+def iter_appointments_by_date(
+    target_date: datetime,
+    calendar_ids_file: str = "calendars.json",
+) -> Iterator[List[Appointment]]:
+    """
+    Yield the appointments of a date in chunks, as calendars answer
+
+    Same appointments as get_appointments_by_date, but each service account
+    batch is yielded as soon as its request completes instead of after the
+    slowest one. Each chunk is sorted by time; the chunks are not. A cached
+    day is yielded as one chunk; streamed days are not cached.
+
+    Args:
+        target_date: The date to search for appointments (datetime object)
+        calendar_ids_file: Path to JSON file containing calendar IDs (default: "calendars.json")
+
+    Yields:
+        Lists of appointments, one per completed batch
+    """
+    calendar_ids = load_calendar_ids_from_file(calendar_ids_file)
+    if not calendar_ids:
+        logger.warning("No calendar IDs found")
+        return
+
+    target_date_obj = (
+        target_date.date() if isinstance(target_date, datetime) else target_date
+    )
+    cached = _day_cache.get((tuple(calendar_ids), target_date_obj))
+    if cached is not None:
+        yield list(cached)
+        return
+
+    time_min, time_max = _day_bounds(target_date_obj)
+    for events_by_calendar, _ in _iter_event_batches(calendar_ids, time_min, time_max):
+        chunk = [
+            appt
+            for calendar_id, events in events_by_calendar.items()
+            for appt in _expand_events(calendar_id, events, include_unattended=True)
+        ]
+        if chunk:
+            chunk.sort(key=attrgetter("time"))
+            yield chunk
+
+
 def get_matched_appointments(
     first_name: str,
     last_name: str,
@@ -253,7 +940,8 @@ def get_matched_appointments(
     service: str,
     service_account_file: str | List[str] | None = None,
     calendar_ids_file: str = "calendars.json",
-) -> List[Dict]:
+    attendee_email: str | None = None,
+) -> List[Appointment]:
     """
     Retrieve matched appointments based on customer details
 
@@ -266,6 +954,8 @@ def get_matched_appointments(
         service: Service type to match
         service_account_file: Deprecated - kept for backward compatibility
         calendar_ids_file: Path to JSON file containing calendar IDs (default: "calendars.json")
+        attendee_email: Optional customer email; when given, events are
+            searched by this email instead of matching the name
 
     Returns:
         List of matched appointments with details
@@ -275,137 +965,47 @@ def get_matched_appointments(
         calendar_ids = load_calendar_ids_from_file(calendar_ids_file)
 
         if not calendar_ids:
-            print("⚠️  No calendar IDs found")
+            logger.warning("No calendar IDs found")
             return []
 
-        print("🔍 Searching for appointments:")
-        print(f"   Name: {first_name} {last_name}")
-        print(f"   Date: {start_time.date()}")
-        print(f"   Service: {service}")
-        print(f"   Searching {len(calendar_ids)} calendar(s)...")
-
-        # Collect appointments from all calendars
-        all_appointments = []
-        today = datetime.now(LOCAL_TZ).date()
-        time_min = datetime.combine(today, time.min).replace(tzinfo=LOCAL_TZ)
-        time_max = datetime.combine(today + timedelta(days=90), time.min).replace(
-            tzinfo=LOCAL_TZ
+        logger.info(
+            "Searching %d calendar(s) for appointments: name=%s %s date=%s service=%s",
+            len(calendar_ids),
+            first_name,
+            last_name,
+            start_time.date(),
+            service,
         )
 
-        # Process each calendar
-        for calendar_id in calendar_ids:
-            try:
-                # Get credentials for this specific calendar
-                creds = get_credentials_for_calendar(calendar_id)
-                if not creds:
-                    print(f"⚠️  Skipping {calendar_id} - no credentials")
-                    continue
-
-                service_api = build("calendar", "v3", credentials=creds)
-
-                # Query events from this calendar
-                try:
-                    events_result = (
-                        service_api.events()
-                        .list(
-                            calendarId=calendar_id,
-                            timeMin=time_min.isoformat(),
-                            timeMax=time_max.isoformat(),
-                            singleEvents=True,
-                            orderBy="startTime",
-                        )
-                        .execute()
-                    )
-
-                    events = events_result.get("items", [])
-
-                    for event in events:
-                        event_id = event.get("id")
-                        summary = event.get("summary", "")
-                        start_time_str = event["start"].get(
-                            "dateTime", event["start"].get("date")
-                        )
-
-                        if "T" in start_time_str:
-                            appointment_datetime = datetime.fromisoformat(
-                                start_time_str.replace("Z", "+00:00")
-                            )
-                        else:
-                            appointment_datetime = datetime.fromisoformat(
-                                start_time_str
-                            ).replace(tzinfo=LOCAL_TZ)
-
-                        attendees = event.get("attendees", [])
-                        organizer = event.get("organizer", {})
-                        organizer_email = organizer.get("email")
-                        organizer_name = organizer.get("displayName")
-
-                        for attendee in attendees:
-                            appointment = {
-                                "event_id": event_id,
-                                "calendar_id": calendar_id,
-                                "event_summary": summary,
-                                "attendee_email": attendee.get("email"),
-                                "attendee_name": attendee.get(
-                                    "displayName", attendee.get("email", "")
-                                ),
-                                "organizer_email": organizer_email,
-                                "organizer_name": organizer_name,
-                                "datetime": appointment_datetime,
-                                "date": appointment_datetime.date(),
-                                "time": appointment_datetime.time(),
-                                "service_account": calendar_id,  # Use calendar_id as identifier
-                            }
-                            all_appointments.append(appointment)
-
-                except Exception as e:
-                    print(f"⚠️  Error polling calendar {calendar_id}: {e}")
-
-            except Exception as e:
-                print(f"❌ Error with calendar {calendar_id}: {e}")
-
-        # Match appointments
-        full_name = f"{first_name} {last_name}".strip().lower()
-        full_name_no_space = full_name.replace(" ", "")  # Remove spaces for matching
+        # Appointments of the requested day, reused for a short while
         target_date = start_time.date()
-        service_lower = service.lower()
-
-        matched = []
-        for appt in all_appointments:
-            appt_name = appt["attendee_name"].lower() if appt["attendee_name"] else ""
-            appt_name_no_space = appt_name.replace(
-                " ", ""
-            )  # Remove spaces for matching
-            appt_service = (
-                appt["event_summary"].lower() if appt["event_summary"] else ""
-            )
-            appt_date = appt["date"]
-
-            # Match name (flexible - check if names match with or without spaces)
-            name_match = (
-                full_name in appt_name
-                or appt_name in full_name
-                or full_name_no_space in appt_name_no_space
-                or appt_name_no_space in full_name_no_space
-            )
-
-            # Match date
-            date_match = appt_date == target_date
+        cache_key = (tuple(calendar_ids), target_date)
+        index = _index_cache.get(cache_key)
+
+        if attendee_email:
+            if index is None:
+                # Let Google select the events of that attendee; the result is
+                # not cached since it only covers one customer
+                appointments, _ = _collect_appointments(
+                    calendar_ids, target_date, query=attendee_email.strip()
+                )
+                index = AppointmentIndex(appointments)
+            matched = index.lookup_email(attendee_email, target_date, service)
+        else:
 
-            # Match service (flexible - substring match)
-            service_match = (
-                service_lower in appt_service or appt_service in service_lower
-            )
+            def load_index() -> Tuple[AppointmentIndex, bool]:
+                appointments, complete = _collect_appointments(
+                    calendar_ids, target_date
+                )
+                return AppointmentIndex(appointments), complete
 
-            if name_match and date_match and service_match:
-                matched.append(appt)
+            if index is None:
+                index = _index_cache.get_or_load(cache_key, load_index)
+            matched = index.lookup(first_name, last_name, target_date, service)
 
-        print(f"\n✅ Found {len(matched)} matched appointment(s)")
+        logger.info("Found %d matched appointment(s)", len(matched))
         return matched
 
     except Exception as e:
-        print(f"❌ Error retrieving appointments: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("Error retrieving appointments: %s", e)
         return []
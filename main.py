@@ -1,41 +1,91 @@
 from __future__ import annotations
-import json
+import asyncio
+import hashlib
+import logging
 import os
+import pickle
+import re
+import stat
+from functools import lru_cache
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from pathlib import Path
+from time import monotonic
 from zoneinfo import ZoneInfo
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
 from fastapi.middleware.cors import CORSMiddleware
 
-import yaml
+import orjson
 
-# DeepSeek (OpenAI Compatible Client)
-from openai import OpenAI
+try:
+    import ahocorasick
+except ImportError:  # optional: keyword fallback uses a compiled regex instead
+    ahocorasick = None
 
 # Appointment Management
 from consumer_book_appointment import (
     get_appointments_by_date,
     get_matched_appointments,
+    invalidate_date,
+    iter_appointments_by_date,
 )
 
+logger = logging.getLogger(__name__)
+
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 DEEPSEEK_BASE_URL = "https://api.deepseek.com"
 DEEPSEEK_MODEL = "deepseek-chat"
 
 
+@lru_cache(maxsize=1)
+def _deepseek_client():
+    """
+    shared DeepSeek client, created on first use
+
+    one client per process so the connection pool is reused between requests;
+    async so classify and chat streams await DeepSeek instead of holding
+    threads. HTTP/2 lets concurrent requests share a single TLS connection.
+    openai/httpx are imported here so they don't slow down worker start.
+    """
+    if not DEEPSEEK_API_KEY:
+        raise RuntimeError("DeepSeek API key not configured")
+
+    # DeepSeek (OpenAI Compatible Client)
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncOpenAI(
+        api_key=DEEPSEEK_API_KEY,
+        base_url=DEEPSEEK_BASE_URL,
+        http_client=DefaultAsyncHttpxClient(
+            http2=True,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        ),
+    )
+
+
 # ======================================================
 #  LOAD MULTI-ORGANIZATION CONFIG  (NEW YAML SCHEMA)
 # ======================================================
 
 CONFIG_DIR = "orgs"
+# parsed org configs are pickled here, outside the source tree; set it to an
+# empty string to turn the cache off
+ORG_CACHE_DIR = os.getenv("ORG_CACHE_DIR", os.path.expanduser("~/.cache/cil-backend"))
+# bump when _load_org_file's output changes so cached pickles are not reused
+ORG_CACHE_VERSION = 1
 
 # every org -> { program_name -> { description, keywords, services:{ service_key -> {...}} } }
 ORG_PROGRAMS: Dict[str, Dict[str, Any]] = {}
 # every org -> { program_name -> [keywords...] }，
 ORG_KEYWORDS: Dict[str, Dict[str, List[str]]] = {}
+# every org -> (text -> {keywords found}, { program_name -> {keywords} })
+ORG_KEYWORD_MATCHERS: Dict[str, Any] = {}
 
 
 def _ensure_list(x):
@@ -48,8 +98,13 @@ def _ensure_list(x):
 
 def _load_org_file(path: str) -> Dict[str, Any]:
     """load yaml as programs_by_name structure"""
+    # only needed when there is no cached pickle for the current files
+    import yaml
+
+    # libyaml-backed loader when PyYAML was built with it
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(path, "r", encoding="utf-8") as f:
-        raw = yaml.safe_load(f) or {}
+        raw = yaml.load(f, Loader=loader) or {}
 
     programs = raw.get("programs", [])
     if not isinstance(programs, list):
@@ -104,13 +159,16 @@ def _load_org_file(path: str) -> Dict[str, Any]:
 
             collected_keywords.extend(all_s_keywords)
 
+        # keywords are already lowercased; dedupe so terms repeated across
+        # services count once, and share one list between both views
+        keywords = sorted({k for k in collected_keywords if k})
         programs_by_name[pname] = {
             "description": pdesc,
-            "keywords": [k.lower() for k in collected_keywords],
+            "keywords": keywords,
             "services": services_by_key,
         }
 
-        program_keywords_by_name[pname] = [k.lower() for k in collected_keywords]
+        program_keywords_by_name[pname] = keywords
 
     return {
         "programs_by_name": programs_by_name,
@@ -118,12 +176,79 @@ def _load_org_file(path: str) -> Dict[str, Any]:
     }
 
 
+def _owned_private(st: os.stat_result) -> bool:
+    """owned by this user and not writable by anyone else"""
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _load_all_orgs() -> Dict[str, Dict[str, Any]]:
+    """
+    parse every org yaml, reusing a pickle of the result while no file changed
+
+    the cache key covers file names + mtimes (and ORG_CACHE_VERSION for the
+    derived structure). pickles are only loaded from a directory and file
+    owned by this user and writable by nobody else, i.e. ones this process
+    layout wrote; cache failures are logged and the yaml is parsed instead
+    """
+    # hidden files and anything that is not a regular file are skipped
+    with os.scandir(CONFIG_DIR) as it:
+        entries = sorted(
+            (
+                e
+                for e in it
+                if e.name.endswith(".yaml")
+                and not e.name.startswith(".")
+                and e.is_file()
+            ),
+            key=lambda e: e.name,
+        )
+    if not ORG_CACHE_DIR:
+        return {e.name[: -len(".yaml")]: _load_org_file(e.path) for e in entries}
+
+    stamp = repr(
+        [ORG_CACHE_VERSION] + [(e.name, e.stat().st_mtime_ns) for e in entries]
+    )
+    key = hashlib.blake2b(stamp.encode(), digest_size=16).hexdigest()
+    # one subdirectory per config dir, so checkouts sharing ORG_CACHE_DIR
+    # don't remove each other's pickles
+    config_key = hashlib.blake2b(
+        os.path.abspath(CONFIG_DIR).encode(), digest_size=8
+    ).hexdigest()
+    cache_dir = Path(ORG_CACHE_DIR) / f"orgs-{config_key}"
+    cache_path = cache_dir / f"{key}.pkl"
+
+    try:
+        with open(cache_path, "rb") as f:
+            if _owned_private(os.stat(cache_dir)) and _owned_private(
+                os.fstat(f.fileno())
+            ):
+                return pickle.load(f)
+            logger.warning(
+                "Ignoring org cache %s: not private to this user", cache_path
+            )
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Ignoring unreadable org cache %s: %s", cache_path, e)
+
+    loaded = {e.name[: -len(".yaml")]: _load_org_file(e.path) for e in entries}
+
+    try:
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        for stale in cache_dir.glob("*.pkl"):
+            stale.unlink()
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "wb") as f:
+            pickle.dump(loaded, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("Could not write org cache %s: %s", cache_path, e)
+    return loaded
+
+
 # scan org path
-for filename in os.listdir(CONFIG_DIR):
-    if not filename.endswith(".yaml"):
-        continue
-    org = filename.replace(".yaml", "")
-    loaded = _load_org_file(os.path.join(CONFIG_DIR, filename))
+for org, loaded in _load_all_orgs().items():
     ORG_PROGRAMS[org] = loaded["programs_by_name"]
     ORG_KEYWORDS[org] = loaded["program_keywords_by_name"]
 
@@ -137,6 +262,58 @@ if "default" not in ORG_PROGRAMS:
         ORG_PROGRAMS["default"] = {}
         ORG_KEYWORDS["default"] = {}
 
+
+def _build_keyword_matcher(program_keywords: Dict[str, List[str]]):
+    """one matcher per org so a single pass over the text finds every keyword"""
+    keyword_sets = {
+        pname: frozenset(kwlist) for pname, kwlist in program_keywords.items()
+    }
+    keywords = sorted(set().union(*keyword_sets.values()))
+
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for kw in keywords:
+            automaton.add_word(kw, kw)
+        automaton.make_automaton()
+
+        def find_hits(t: str) -> set:
+            return {kw for _, kw in automaton.iter(t)}
+
+    else:
+        # longest keyword starting at each position (longest-first alternation
+        # in a lookahead); shorter keywords inside it are added via `contained`
+        pattern = re.compile(
+            "(?=("
+            + "|".join(map(re.escape, sorted(keywords, key=len, reverse=True)))
+            + "))"
+        )
+        contained = {kw: [k for k in keywords if k in kw] for kw in keywords}
+
+        def find_hits(t: str) -> set:
+            hits = set()
+            for kw in set(pattern.findall(t)):
+                hits.update(contained[kw])
+            return hits
+
+    return find_hits, keyword_sets
+
+
+for org, program_keywords in ORG_KEYWORDS.items():
+    if any(program_keywords.values()):
+        ORG_KEYWORD_MATCHERS[org] = _build_keyword_matcher(program_keywords)
+
+# every org -> [program names] / { program_name -> description }, for classify
+ORG_CATEGORIES: Dict[str, List[str]] = {
+    org: list(programs) for org, programs in ORG_PROGRAMS.items()
+}
+ORG_DESCRIPTIONS: Dict[str, Dict[str, str]] = {
+    org: {pname: pdata.get("description", "") for pname, pdata in programs.items()}
+    for org, programs in ORG_PROGRAMS.items()
+}
+
+# requested organization -> configured org; unknown names go to .get(..., "default")
+ORG_RESOLVE: Dict[str, str] = {org: org for org in ORG_PROGRAMS}
+
 # ======================================================
 #   Models
 # ======================================================
@@ -162,6 +339,27 @@ class ClassifyResponse(BaseModel):
     used_fallback: bool = False
 
 
+# === DeepSeek Classify Output ===
+class LLMOption(BaseModel):
+    """one option as returned by the model; missing fields get defaults later"""
+
+    category: Optional[str] = None
+    confidence: Optional[float] = None
+    reasoning: Optional[str] = None
+
+
+class LLMClassifyOut(BaseModel):
+    """shape requested by CLASSIFY_RULES_PROMPT"""
+
+    best: LLMOption = Field(default_factory=LLMOption)
+    alternatives: List[LLMOption] = Field(default_factory=list)
+
+    @field_validator("alternatives", mode="before")
+    @classmethod
+    def _as_list(cls, value):
+        return _ensure_list(value)
+
+
 # === Appointment Management Models ===
 class SearchByDateRequest(BaseModel):
     """Request model for searching appointments by date"""
@@ -180,6 +378,13 @@ class SearchByCustomerRequest(BaseModel):
     service: str
     service_account_file: str = "service_accounts.txt"
     calendar_ids_file: str = "calendars.json"
+    attendee_email: Optional[str] = None
+
+
+class InvalidateAppointmentsRequest(BaseModel):
+    """Request model for dropping cached appointments of a date"""
+
+    target_date: str
 
 
 class AppointmentResponse(BaseModel):
@@ -228,12 +433,23 @@ def _keyword_guess(
     top_k: int,
     programs: Dict[str, Any],
     program_keywords: Dict[str, List[str]],
+    matcher: Any = None,
 ) -> ClassifyResponse:
     t = (text or "").lower()
     scores: List[tuple[str, int]] = []
-    for pname, kwlist in program_keywords.items():
-        score = sum(1 for w in kwlist if w and w in t)
-        scores.append((pname, score))
+    if matcher is not None:
+        # score = number of program keywords occurring in the text, as below
+        find_hits, keyword_sets = matcher
+        hits = find_hits(t)
+        for pname in program_keywords:
+            scores.append((pname, len(hits & keyword_sets[pname])))
+    else:
+        for pname, kwlist in program_keywords.items():
+            if not kwlist:
+                scores.append((pname, 0))
+                continue
+            score = sum(1 for w in kwlist if w in t)
+            scores.append((pname, score))
     scores.sort(key=lambda x: x[1], reverse=True)
 
     if not scores or scores[0][1] == 0:
@@ -282,68 +498,240 @@ def _keyword_guess(
 #   DeepSeek Non-Streaming Classification
 #   （categories = program name；services）
 # ======================================================
-def _call_llm(text: str, top_k: int, programs: Dict[str, Any], categories: List[str]):
-    if not DEEPSEEK_API_KEY:
-        raise RuntimeError("DeepSeek API key not configured")
+# static rules sent first, byte-identical for every request and org, so
+# DeepSeek's prefix cache can reuse them; the org's programs follow
+CLASSIFY_RULES_PROMPT = """
+    You classify messages sent to a Center for Independent Living into one of
+    its programs. Use ONLY the exact program names from the program list.
+
+    Answer with a json object of this shape:
+    {"best": {"category": "<program name>", "confidence": <0 to 1>, "reasoning": "<one short sentence>"},
+     "alternatives": [{"category": "<program name>", "confidence": <0 to 1>, "reasoning": "<one short sentence>"}]}
+    List at most Top-K minus 1 alternatives, most likely first.
+    """
 
-    client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
+# same rules for several messages in one completion (see _call_llm_batch)
+CLASSIFY_BATCH_RULES_PROMPT = """
+    You classify messages sent to a Center for Independent Living into one of
+    its programs. Use ONLY the exact program names from the program list.
+
+    You get a json list of {"id": <number>, "message": "<text>", "top_k": <number>}
+    objects. Classify each message on its own and answer with a json object of
+    this shape:
+    {"results": [{"id": <id of the message>,
+                  "best": {"category": "<program name>", "confidence": <0 to 1>, "reasoning": "<one short sentence>"},
+                  "alternatives": [{"category": "<program name>", "confidence": <0 to 1>, "reasoning": "<one short sentence>"}]}]}
+    Give exactly one result per message and copy its id unchanged. List at
+    most top_k minus 1 alternatives per message, most likely first.
+    """
 
-    compact_programs = {}
+
+def _classify_programs_prompt(programs: Dict[str, Any]) -> str:
+    """static per org; built once at import (see ORG_CLASSIFY_PROMPTS)"""
+    lines = ["Programs (name: description):"]
     for pname, pdata in programs.items():
-        compact_programs[pname] = {
-            "description": pdata.get("description", ""),
-            "services": [
-                {
-                    "key": skey,
-                    "phone": sdata.get("phone", ""),
-                    "has_contacts": bool(sdata.get("contacts")),
-                    "has_keywords": bool(sdata.get("keywords")),
-                }
-                for skey, sdata in (pdata.get("services") or {}).items()
-            ],
-        }
+        desc = " ".join((pdata.get("description") or "").split())
+        lines.append(f"- {pname}: {desc[:200]}{'...' if len(desc) > 200 else ''}")
+    return "\n".join(lines)
 
-    system_prompt = f"""
-    You are a warm and helpful intake navigator at a Center for Independent Living.
 
-    *** HARD RULES (DO NOT BREAK) ***
-    1. You MUST NOT invent or guess any program or service names.
-    2. You may ONLY mention services that appear in the list below.
-    3. If you cannot confidently identify ONE specific service, ask **ONE** short clarifying question instead of guessing.
-    4. If the user request matches a program but not a specific service, say the program name but clearly state that you need one clarification before recommending a service.
-    5. When recommending a service, ALWAYS include:
-    - Service Name (exact `service.key`)
-    - Phone (if exists)
-    - Contact person name & email (if exists)
-    - Booking link (if exists)
-
-    *** PRIORITY ***
-    - ALWAYS prefer recommending a **service** over a program (if identifiable).
-    - Keep answers short (2–4 sentences), friendly, and concrete.
-
-    *** ALLOWED PROGRAMS & SERVICES (YOU CANNOT USE ANYTHING OUTSIDE THIS LIST) ***
-    {_programs_for_prompt(programs)}
-
-    You must treat this list as the ONLY valid universe of programs and services.
-    Do NOT create new names.
-    Do NOT modify names.
-    Do NOT guess missing information.
-    """
+def _best_object_span(raw: str) -> Optional[tuple[int, int]]:
+    """span of the top-level "best": {...} object once it is complete, else None"""
+    depth = 0
+    in_string = escaped = False
+    string_start = 0
+    last_string = key = None
+    start = -1
+    for i, ch in enumerate(raw):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                last_string = raw[string_start:i]
+            continue
+        if ch == '"':
+            in_string = True
+            string_start = i + 1
+        elif ch == ":" and depth == 1:
+            key = last_string
+        elif ch in "{[":
+            if ch == "{" and depth == 1 and key == "best":
+                start = i
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if start >= 0 and depth == 1:
+                return start, i + 1
+    return None
+
+
+async def _call_llm(text: str, top_k: int, programs_prompt: str):
+    client = _deepseek_client()
 
     user_prompt = f"Message:\n{text}\nTop-K: {top_k}"
 
-    resp = client.chat.completions.create(
+    stream = await client.chat.completions.create(
         model=DEEPSEEK_MODEL,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": CLASSIFY_RULES_PROMPT},
+            {"role": "system", "content": programs_prompt},
             {"role": "user", "content": user_prompt},
         ],
+        response_format={"type": "json_object"},
+        stream=True,
         temperature=0,
         max_tokens=300,
     )
 
-    raw = resp.choices[0].message.content or "{}"
-    return json.loads(raw)
+    # with top_k <= 1 alternatives are dropped anyway, so stop reading as soon
+    # as "best" is complete instead of waiting for the last token
+    parts: List[str] = []
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if not content:
+                continue
+            parts.append(content)
+            if top_k <= 1:
+                raw = "".join(parts)
+                span = _best_object_span(raw)
+                if span:
+                    return {"best": orjson.loads(raw[span[0] : span[1]])}
+    finally:
+        await stream.close()
+
+    raw = "".join(parts) or "{}"
+    return orjson.loads(raw)
+
+
+async def _call_llm_batch(
+    items: List[tuple[str, int]], programs_prompt: str
+) -> Dict[int, Dict[str, Any]]:
+    """
+    classify several messages with one completion
+
+    results are keyed by the index of their item, taken from the id the model
+    echoes back; items without exactly one result are left out
+    """
+    client = _deepseek_client()
+
+    user_prompt = orjson.dumps(
+        [{"id": i, "message": t, "top_k": k} for i, (t, k) in enumerate(items)]
+    ).decode()
+
+    resp = await client.chat.completions.create(
+        model=DEEPSEEK_MODEL,
+        messages=[
+            {"role": "system", "content": CLASSIFY_BATCH_RULES_PROMPT},
+            {"role": "system", "content": programs_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0,
+        max_tokens=300 * len(items),
+    )
+
+    data = orjson.loads(resp.choices[0].message.content or "{}")
+    results = data.get("results") if isinstance(data, dict) else None
+    if not isinstance(results, list):
+        raise ValueError("batch classify result has no results list")
+
+    by_id: Dict[int, Dict[str, Any]] = {}
+    duplicates = set()
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        i = result.get("id")
+        if type(i) is not int or not 0 <= i < len(items):
+            continue
+        if i in by_id:
+            duplicates.add(i)
+        by_id[i] = result
+    for i in duplicates:
+        del by_id[i]
+    return by_id
+
+
+# classify calls arriving while another one is in flight are grouped, up to
+# this many per DeepSeek request or this long after the first one queued
+CLASSIFY_BATCH_SIZE = 8
+CLASSIFY_BATCH_WAIT_SECONDS = 0.02
+
+
+class _ClassifyBatcher:
+    """
+    send concurrent classify calls of one org to DeepSeek as a single request
+
+    an idle server calls _call_llm right away; batching only kicks in while
+    another call is outstanding, so it never delays a lone request
+    """
+
+    def __init__(self, max_batch: int, max_wait: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._in_flight = 0
+        # programs prompt (one per org) -> [(text, top_k, future)]
+        self._pending: Dict[str, List[tuple[str, int, asyncio.Future]]] = {}
+        self._tasks: set = set()
+
+    async def submit(self, text: str, top_k: int, programs_prompt: str):
+        if self._in_flight == 0 and programs_prompt not in self._pending:
+            self._in_flight += 1
+            try:
+                return await _call_llm(text, top_k, programs_prompt)
+            finally:
+                self._in_flight -= 1
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(programs_prompt, [])
+        batch.append((text, top_k, future))
+        if len(batch) >= self.max_batch:
+            self._flush(programs_prompt)
+        elif len(batch) == 1:
+            loop.call_later(self.max_wait, self._flush, programs_prompt)
+        return await future
+
+    def _flush(self, programs_prompt: str) -> None:
+        batch = self._pending.pop(programs_prompt, None)
+        if batch:
+            task = asyncio.ensure_future(self._run(batch, programs_prompt))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch, programs_prompt: str) -> None:
+        self._in_flight += 1
+        try:
+            if len(batch) == 1:
+                text, top_k, _ = batch[0]
+                results = {0: await _call_llm(text, top_k, programs_prompt)}
+            else:
+                results = await _call_llm_batch(
+                    [(text, top_k) for text, top_k, _ in batch], programs_prompt
+                )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= 1
+
+        for i, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if i in results:
+                future.set_result(results[i])
+            else:
+                future.set_exception(ValueError("no batch classify result for message"))
+
+
+CLASSIFY_BATCHER = _ClassifyBatcher(CLASSIFY_BATCH_SIZE, CLASSIFY_BATCH_WAIT_SECONDS)
 
 
 # ======================================================
@@ -397,11 +785,8 @@ def _programs_for_prompt(programs: Dict[str, Any], max_services_each: int = 4) -
     return "\n".join(lines)
 
 
-def stream_chat(messages, organization="default"):
-    org = organization if organization in ORG_PROGRAMS else "default"
-    programs = ORG_PROGRAMS.get(org, {})
-
-    system_prompt = f"""
+# static chat rules, sent ahead of the per-org programs (see ORG_CHAT_PROMPTS)
+CHAT_RULES_PROMPT = """
     You are a warm and helpful intake navigator at a Center for Independent Living.
 
     Your job:
@@ -421,38 +806,181 @@ def stream_chat(messages, organization="default"):
     • Another service under the same program that DOES have a contact
     • OR the program’s main phone number
     - Do NOT output JSON. Respond conversationally and kindly.
-
-    Available programs & services:
-    {_programs_for_prompt(programs)}
     """
 
-    client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
 
-    resp = client.chat.completions.create(
+def _chat_programs_prompt(programs: Dict[str, Any]) -> str:
+    """static per org; built once at import (see ORG_CHAT_PROMPTS)"""
+    return "Available programs & services:\n" + _programs_for_prompt(programs)
+
+
+# stream_chat flushes once this many chars are buffered or this much time passed
+STREAM_FLUSH_CHARS = 32
+STREAM_FLUSH_SECONDS = 0.02
+
+
+async def stream_chat(messages, organization="default"):
+    org = ORG_RESOLVE.get(organization, "default")
+    programs_prompt = ORG_CHAT_PROMPTS[org]
+
+    client = _deepseek_client()
+
+    resp = await client.chat.completions.create(
         model=DEEPSEEK_MODEL,
-        messages=[{"role": "system", "content": system_prompt}] + messages,
+        messages=[
+            {"role": "system", "content": CHAT_RULES_PROMPT},
+            {"role": "system", "content": programs_prompt},
+        ]
+        + messages,
         stream=True,
         temperature=0.1,
         max_tokens=300,
     )
 
-    for chunk in resp:
-        delta = chunk.choices[0].delta
-        content = getattr(delta, "content", None)
-        if content:
-            yield content
+    # coalesce tiny deltas into fewer frames; the first one goes out at once
+    buf: List[str] = []
+    buffered = 0
+    last_flush = float("-inf")
+    try:
+        async for chunk in resp:
+            delta = chunk.choices[0].delta
+            content = getattr(delta, "content", None)
+            if content:
+                buf.append(content)
+                buffered += len(content)
+                now = monotonic()
+                if (
+                    buffered >= STREAM_FLUSH_CHARS
+                    or now - last_flush >= STREAM_FLUSH_SECONDS
+                ):
+                    yield "".join(buf)
+                    buf.clear()
+                    buffered = 0
+                    last_flush = now
+        if buf:
+            yield "".join(buf)
+    finally:
+        # also runs when the consumer stops early: stop generating upstream
+        await resp.close()
+
+
+# no caching or proxy buffering, so each token reaches the browser right away
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+async def _sse_frames(deltas, request: Optional[Request] = None):
+    """wrap text deltas as `data: {"delta": ...}` events, ending with [DONE]"""
+    try:
+        # SSE comment sent before DeepSeek is even called, so headers and a
+        # first chunk reach the browser while the prompt is prefilled
+        yield b": ping\n\n"
+        async for content in deltas:
+            if request is not None and await request.is_disconnected():
+                # client went away; closing deltas cancels the completion
+                return
+            yield b"data: " + orjson.dumps({"delta": content}) + b"\n\n"
+        yield b"data: [DONE]\n\n"
+    finally:
+        await deltas.aclose()
+
+
+# every org -> programs system message (sent after the static rules)
+ORG_CLASSIFY_PROMPTS: Dict[str, str] = {
+    org: _classify_programs_prompt(programs) for org, programs in ORG_PROGRAMS.items()
+}
+ORG_CHAT_PROMPTS: Dict[str, str] = {
+    org: _chat_programs_prompt(programs) for org, programs in ORG_PROGRAMS.items()
+}
+
+
+# ======================================================
+#   Semantic Classify Cache (optional)
+# ======================================================
+# sentence-transformers model used to embed classify texts, e.g.
+# "sentence-transformers/all-MiniLM-L6-v2"; the cache is off when unset
+CLASSIFY_CACHE_MODEL = os.getenv("CLASSIFY_CACHE_MODEL", "")
+# cosine similarity above which a previous answer is reused
+CLASSIFY_CACHE_THRESHOLD = float(os.getenv("CLASSIFY_CACHE_THRESHOLD", "0.92"))
+CLASSIFY_CACHE_SIZE = 1024
+
+
+class _SemanticCache:
+    """reuse classify answers of near-identical texts, per (org, top_k)"""
+
+    def __init__(self, model_name: str, threshold: float, maxsize: int):
+        # imported here so workers without the cache don't load numpy
+        import numpy
+        from sentence_transformers import SentenceTransformer
+
+        self._np = numpy
+        self.model_name = model_name
+        self.threshold = threshold
+        self.maxsize = maxsize
+        # loaded (and downloaded if needed) up front, not on a request thread
+        self._model = SentenceTransformer(model_name)
+        # key -> (float16 matrix of normalized embeddings, responses)
+        self._entries: Dict[Any, tuple[Any, List[ClassifyResponse]]] = {}
+
+    def embed(self, text: str):
+        """normalized embedding of text (blocking; run in a worker thread)"""
+        return self._model.encode(text, normalize_embeddings=True).astype(
+            self._np.float16
+        )
+
+    def lookup(self, key, embedding) -> Optional[ClassifyResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        matrix, responses = entry
+        sims = matrix @ embedding
+        i = int(sims.argmax())
+        return responses[i] if sims[i] >= self.threshold else None
+
+    def add(self, key, embedding, response: ClassifyResponse) -> None:
+        matrix, responses = self._entries.get(key, (None, []))
+        row = embedding[self._np.newaxis, :]
+        if matrix is None:
+            matrix = row
+        else:
+            # oldest entries drop out first
+            start = max(0, len(responses) + 1 - self.maxsize)
+            matrix = self._np.vstack([matrix[start:], row])
+            responses = responses[start:]
+        self._entries[key] = (matrix, responses + [response])
+
+
+def _semantic_cache() -> Optional[_SemanticCache]:
+    """the semantic cache with its model loaded, or None if off or unavailable"""
+    if not CLASSIFY_CACHE_MODEL:
+        return None
+    try:
+        return _SemanticCache(
+            CLASSIFY_CACHE_MODEL, CLASSIFY_CACHE_THRESHOLD, CLASSIFY_CACHE_SIZE
+        )
+    except Exception as e:
+        # missing packages, unknown model name, no network: run without it
+        logger.warning("Semantic classify cache disabled: %s", e)
+        return None
+
+
+SEMANTIC_CACHE = _semantic_cache()
 
 
 # ======================================================
 #   Classify Orchestrator
 # ======================================================
-def classify(
+async def classify(
     text: str, top_k: int = 2, organization: str = "default"
 ) -> ClassifyResponse:
-    org = organization if organization in ORG_PROGRAMS else "default"
+    org = ORG_RESOLVE.get(organization, "default")
     programs = ORG_PROGRAMS.get(org, {})
     program_keywords = ORG_KEYWORDS.get(org, {})
-    categories = list(programs.keys())
+    categories = ORG_CATEGORIES.get(org, [])
+    descriptions = ORG_DESCRIPTIONS.get(org, {})
 
     if not categories:
         # fall back no programs
@@ -464,52 +992,80 @@ def classify(
         )
         return ClassifyResponse(best=best, alternatives=[], used_fallback=True)
 
+    cache_key = (org, top_k)
+    embedding = None
+    if SEMANTIC_CACHE is not None:
+        try:
+            embedding = await run_in_threadpool(SEMANTIC_CACHE.embed, text)
+        except Exception:
+            # cache is best effort; classify normally
+            embedding = None
+        else:
+            cached = SEMANTIC_CACHE.lookup(cache_key, embedding)
+            if cached is not None:
+                return cached
+
     try:
-        data = _call_llm(text, top_k, programs, categories)
-        best = data.get("best", {})
-        alts = _ensure_list(data.get("alternatives"))
+        data = await CLASSIFY_BATCHER.submit(text, top_k, ORG_CLASSIFY_PROMPTS[org])
+        # validation errors fall back to keyword matching below
+        out = LLMClassifyOut.model_validate(data)
 
-        best_cat = best.get("category", categories[0])
+        best_cat = out.best.category or categories[0]
         best_opt = Option(
             category=best_cat,
-            confidence=float(best.get("confidence", 0.5)),
-            reasoning=best.get("reasoning"),
-            description=programs.get(best_cat, {}).get("description", ""),
+            confidence=0.5 if out.best.confidence is None else out.best.confidence,
+            reasoning=out.best.reasoning,
+            description=descriptions.get(best_cat, ""),
         )
 
         alt_opts: List[Option] = []
-        for o in alts[: max(0, top_k - 1)]:
-            oc = o.get("category")
-            if not oc or oc not in programs:
+        for o in out.alternatives[: max(0, top_k - 1)]:
+            if not o.category or o.category not in descriptions:
                 continue
             alt_opts.append(
                 Option(
-                    category=oc,
-                    confidence=float(o.get("confidence", 0.3)),
-                    reasoning=o.get("reasoning"),
-                    description=programs.get(oc, {}).get("description", ""),
+                    category=o.category,
+                    confidence=0.3 if o.confidence is None else o.confidence,
+                    reasoning=o.reasoning,
+                    description=descriptions[o.category],
                 )
             )
 
-        return ClassifyResponse(
+        result = ClassifyResponse(
             best=best_opt, alternatives=alt_opts, used_fallback=False
         )
+        if embedding is not None:
+            SEMANTIC_CACHE.add(cache_key, embedding, result)
+        return result
 
     except Exception:
         # fall back to keyword matching
-        return _keyword_guess(text, top_k, programs, program_keywords)
+        return _keyword_guess(
+            text, top_k, programs, program_keywords, ORG_KEYWORD_MATCHERS.get(org)
+        )
 
 
 # ======================================================
 #   FastAPI
 # ======================================================
-app = FastAPI()
+# orjson encodes the (often long) appointment lists much faster than stdlib json
+app = FastAPI(default_response_class=ORJSONResponse)
+# comma-separated browser origins allowed to call the API; "*" (default) keeps
+# the permissive policy: any origin (echoed back for credentialed requests),
+# method and header
+FRONTEND_ORIGINS = [
+    o.strip() for o in os.getenv("FRONTEND_ORIGINS", "*").split(",") if o.strip()
+]
+_CORS_ANY_ORIGIN = "*" in FRONTEND_ORIGINS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=FRONTEND_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # an explicit origin list also narrows methods/headers to what the API uses
+    allow_methods=["*"] if _CORS_ANY_ORIGIN else ["GET", "POST"],
+    allow_headers=["*"] if _CORS_ANY_ORIGIN else ["content-type", "authorization"],
+    # let browsers reuse a preflight for a day instead of one per request
+    max_age=86400,
 )
 
 
@@ -524,6 +1080,37 @@ def health():
 LOCAL_TZ = ZoneInfo("America/Los_Angeles")
 
 
+def _parse_local_date(value: str) -> datetime:
+    """ISO date or datetime string -> aware datetime in LOCAL_TZ (400 if invalid)"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid date format. Use 'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM:SS'",
+        )
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=LOCAL_TZ)
+    return parsed.astimezone(LOCAL_TZ)
+
+
+def _appointment_row(appt) -> Dict[str, Any]:
+    """AppointmentResponse-shaped dict of an Appointment, for orjson to encode"""
+    return {
+        "event_id": appt.event_id,
+        "calendar_id": appt.calendar_id,
+        "event_summary": appt.event_summary,
+        "attendee_email": appt.attendee_email,
+        "attendee_name": appt.attendee_name,
+        "organizer_email": appt.organizer_email,
+        "organizer_name": appt.organizer_name,
+        "datetime": appt.datetime.isoformat(),
+        "date": appt.date.isoformat(),
+        "time": appt.time.isoformat(),
+        "service_account": appt.service_account,
+    }
+
+
 @app.post(
     "/api/appointments/by-date",
     response_model=SearchByDateResponse,
@@ -534,52 +1121,27 @@ async def search_appointments_by_date(request: SearchByDateRequest):
     """Search all appointments for a specific date (Admin view)"""
     try:
         # Parse the date
-        try:
-            if "T" in request.target_date:
-                target_date = datetime.fromisoformat(request.target_date).replace(
-                    tzinfo=LOCAL_TZ
-                )
-            else:
-                target_date = datetime.strptime(
-                    request.target_date, "%Y-%m-%d"
-                ).replace(tzinfo=LOCAL_TZ)
-        except ValueError:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid date format. Use 'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM:SS'",
-            )
+        target_date = _parse_local_date(request.target_date)
 
-        # Get appointments
-        appointments = get_appointments_by_date(
+        # Get appointments (calendar polling is blocking I/O, keep it off
+        # the event loop)
+        appointments = await run_in_threadpool(
+            get_appointments_by_date,
             target_date=target_date,
             service_account_file=request.service_account_file,
             calendar_ids_file=request.calendar_ids_file,
         )
 
-        # Format response
-        formatted_appointments = [
-            AppointmentResponse(
-                event_id=appt["event_id"],
-                calendar_id=appt["calendar_id"],
-                event_summary=appt["event_summary"],
-                attendee_email=appt["attendee_email"],
-                attendee_name=appt["attendee_name"],
-                organizer_email=appt.get("organizer_email"),
-                organizer_name=appt.get("organizer_name"),
-                datetime=appt["datetime"].isoformat(),
-                date=appt["date"].isoformat(),
-                time=appt["time"].isoformat(),
-                service_account=appt["service_account"],
-            )
-            for appt in appointments
-        ]
-
-        return SearchByDateResponse(
-            success=True,
-            message=f"Found {len(appointments)} appointment(s) on {request.target_date}",
-            date=request.target_date,
-            count=len(appointments),
-            appointments=formatted_appointments,
+        # Format response; plain dicts returned as ORJSONResponse skip
+        # per-row model validation (response_model still documents the shape)
+        return ORJSONResponse(
+            {
+                "success": True,
+                "message": f"Found {len(appointments)} appointment(s) on {request.target_date}",
+                "date": request.target_date,
+                "count": len(appointments),
+                "appointments": [_appointment_row(appt) for appt in appointments],
+            }
         )
 
     except HTTPException:
@@ -591,6 +1153,32 @@ async def search_appointments_by_date(request: SearchByDateRequest):
         )
 
 
+def _ndjson_rows(chunks):
+    # plain generator: StreamingResponse iterates it in a worker thread, so
+    # the blocking calendar polls behind chunks stay off the event loop.
+    # one body write (and thread hop) per completed batch, not per row
+    for chunk in chunks:
+        yield b"".join(orjson.dumps(_appointment_row(a)) + b"\n" for a in chunk)
+
+
+@app.post(
+    "/api/appointments/by-date/stream",
+    summary="Stream appointments by date",
+    description="Same search as /api/appointments/by-date, one appointment per NDJSON line, sent as calendars answer (not sorted)",
+)
+async def stream_appointments_by_date(request: SearchByDateRequest):
+    """Stream all appointments for a specific date as NDJSON"""
+    target_date = _parse_local_date(request.target_date)
+    return StreamingResponse(
+        _ndjson_rows(
+            iter_appointments_by_date(
+                target_date, calendar_ids_file=request.calendar_ids_file
+            )
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
 @app.post(
     "/api/appointments/by-customer",
     response_model=SearchByCustomerResponse,
@@ -601,57 +1189,33 @@ async def search_appointments_by_customer(request: SearchByCustomerRequest):
     """Search appointments for a specific customer"""
     try:
         # Parse the date
-        try:
-            if "T" in request.appointment_date:
-                appointment_date = datetime.fromisoformat(
-                    request.appointment_date
-                ).replace(tzinfo=LOCAL_TZ)
-            else:
-                appointment_date = datetime.strptime(
-                    request.appointment_date, "%Y-%m-%d"
-                ).replace(tzinfo=LOCAL_TZ)
-        except ValueError:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid date format. Use 'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM:SS'",
-            )
+        appointment_date = _parse_local_date(request.appointment_date)
 
-        # Get matched appointments
-        appointments = get_matched_appointments(
+        # Get matched appointments (calendar polling is blocking I/O, keep it
+        # off the event loop)
+        appointments = await run_in_threadpool(
+            get_matched_appointments,
             first_name=request.first_name,
             last_name=request.last_name,
             start_time=appointment_date,
             service=request.service,
             service_account_file=request.service_account_file,
             calendar_ids_file=request.calendar_ids_file,
+            attendee_email=request.attendee_email,
         )
 
-        # Format response
-        formatted_appointments = [
-            AppointmentResponse(
-                event_id=appt["event_id"],
-                calendar_id=appt["calendar_id"],
-                event_summary=appt["event_summary"],
-                attendee_email=appt["attendee_email"],
-                attendee_name=appt["attendee_name"],
-                organizer_email=appt.get("organizer_email"),
-                organizer_name=appt.get("organizer_name"),
-                datetime=appt["datetime"].isoformat(),
-                date=appt["date"].isoformat(),
-                time=appt["time"].isoformat(),
-                service_account=appt["service_account"],
-            )
-            for appt in appointments
-        ]
-
-        return SearchByCustomerResponse(
-            success=True,
-            message=f"Found {len(appointments)} appointment(s) for {request.first_name} {request.last_name}",
-            customer_name=f"{request.first_name} {request.last_name}",
-            search_date=request.appointment_date,
-            service=request.service,
-            count=len(appointments),
-            appointments=formatted_appointments,
+        # Format response; plain dicts returned as ORJSONResponse skip
+        # per-row model validation (response_model still documents the shape)
+        return ORJSONResponse(
+            {
+                "success": True,
+                "message": f"Found {len(appointments)} appointment(s) for {request.first_name} {request.last_name}",
+                "customer_name": f"{request.first_name} {request.last_name}",
+                "search_date": request.appointment_date,
+                "service": request.service,
+                "count": len(appointments),
+                "appointments": [_appointment_row(appt) for appt in appointments],
+            }
         )
 
     except HTTPException:
@@ -663,20 +1227,37 @@ async def search_appointments_by_customer(request: SearchByCustomerRequest):
         )
 
 
+@app.post(
+    "/api/appointments/invalidate",
+    summary="Invalidate cached appointments",
+    description="Drop cached appointments of a date after a booking changed it",
+)
+async def invalidate_appointments(request: InvalidateAppointmentsRequest):
+    """Drop cached appointments of a date so the next search refetches it"""
+    target_date = _parse_local_date(request.target_date)
+    invalidate_date(target_date)
+    return {
+        "success": True,
+        "message": f"Cleared cached appointments for {target_date.date().isoformat()}",
+    }
+
+
 # ======================================================
 #   AI Classification Endpoints
 # ======================================================
 
 
 @app.post("/classify", response_model=ClassifyResponse)
-def classify_endpoint(body: ClassifyRequest):
+async def classify_endpoint(body: ClassifyRequest):
     if not body.text.strip():
         raise HTTPException(status_code=400, detail="Empty text")
-    return classify(body.text.strip(), top_k=body.top_k, organization=body.organization)
+    return await classify(
+        body.text.strip(), top_k=body.top_k, organization=body.organization
+    )
 
 
 @app.post("/chat/stream")
-def chat_stream(body: Dict[str, Any]):
+async def chat_stream(request: Request, body: Dict[str, Any]):
     messages = body.get("messages", [])
     organization = body.get("organization", "default")
 
@@ -684,5 +1265,7 @@ def chat_stream(body: Dict[str, Any]):
         raise HTTPException(status_code=400, detail="messages required")
 
     return StreamingResponse(
-        stream_chat(messages, organization), media_type="text/plain"
+        _sse_frames(stream_chat(messages, organization), request),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
     )